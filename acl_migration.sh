@@ -48,7 +48,7 @@ ACL Migration Tool - POSIX ACL 到 NFSv4 ACL 迁移工具
     -d, --dest PATH         目标路径 (文件或目录, NFSv4 ACL)
 
 可选参数:
-    -w, --workers NUM       并发线程数 (默认: 4, 范围: 1-32)
+    -w, --workers NUM       并发进程数 (默认: CPU核心数 × 2)
     -i, --incremental       启用增量模式 (跳过已迁移的文件)
     --ownership             迁移文件所有权 (默认只迁移ACL)
     --folderonly            只迁移文件夹ACL (跳过文件)
@@ -127,10 +127,9 @@ ACL Migration Tool - POSIX ACL 到 NFSv4 ACL 迁移工具
     - 必须支持 NFSv4 ACL
     - 示例: /mnt/netapp/data, /path/to/target.txt
 
-并发线程数 (-w, --workers):
-    - 范围: 1-32
+并发进程数 (-w, --workers):
     - 推荐值: CPU核心数 × 2
-    - 默认: 4
+    - 默认: CPU核心数 × 2
     - 注意: 过高可能导致系统负载过重
 
 增量模式 (-i, --incremental):
@@ -244,7 +243,8 @@ NFSv4域名 (--domain):
    解决: 确认使用 NFSv4.1 挂载，检查安全风格
 
 4. "迁移中断"
-   解决: 使用 --incremental 参数继续迁移
+   解决: 使用 --incremental 参数继续迁移（只有带 --incremental 的运行才会记录迁移状态，
+         可能需要续传时首次迁移也应加 --incremental）
 
 5. "性能问题"
    解决: 调整 --workers 参数，使用分批迁移
@@ -403,13 +403,14 @@ interactive_mode() {
     done
     
     # 获取并发数
-    read -p "并发线程数 [4]: " WORKERS
-    WORKERS=${WORKERS:-4}
+    local default_workers=$(( $(nproc) * 2 ))
+    read -p "并发进程数 [$default_workers]: " WORKERS
+    WORKERS=${WORKERS:-$default_workers}
     
     # 验证并发数
     if ! [[ "$WORKERS" =~ ^[0-9]+$ ]] || [[ "$WORKERS" -lt 1 ]]; then
-        print_warning "无效的并发数，使用默认值: 4"
-        WORKERS=4
+        print_warning "无效的并发数，使用默认值: $default_workers"
+        WORKERS=$default_workers
     fi
     
     # 增量模式
@@ -540,7 +541,7 @@ main() {
     # 默认值
     SOURCE_DIR=""
     DEST_DIR=""
-    WORKERS=4
+    WORKERS=$(( $(nproc) * 2 ))
     INCREMENTAL=false
     OWNERSHIP=false
     FOLDER_ONLY=false
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+libacl ctypes 绑定
+在进程内读取和修改 POSIX ACL，避免每个文件 fork+exec getfacl/setfacl
+"""
+
+import os
+import ctypes
+import ctypes.util
+
+# sys/acl.h
+ACL_TYPE_ACCESS = 0x8000
+ACL_FIRST_ENTRY = 0
+ACL_NEXT_ENTRY = 1
+ACL_USER_OBJ = 0x01
+ACL_USER = 0x02
+ACL_GROUP_OBJ = 0x04
+ACL_GROUP = 0x08
+ACL_MASK = 0x10
+ACL_OTHER = 0x20
+ACL_READ = 0x04
+ACL_WRITE = 0x02
+ACL_EXECUTE = 0x01
+# acl/libacl.h: acl_to_any_text 选项，用户/组以数字 ID 输出
+TEXT_NUMERIC_IDS = 0x08
+
+
+def _load_libacl():
+    """加载 libacl，不可用时返回 None"""
+    for name in ('libacl.so.1', ctypes.util.find_library('acl')):
+        if not name:
+            continue
+        try:
+            lib = ctypes.CDLL(name, use_errno=True)
+        except OSError:
+            continue
+
+        lib.acl_get_file.argtypes = [ctypes.c_char_p, ctypes.c_uint]
+        lib.acl_get_file.restype = ctypes.c_void_p
+        lib.acl_to_any_text.argtypes = [ctypes.c_void_p, ctypes.c_char_p,
+                                        ctypes.c_char, ctypes.c_int]
+        # 返回值需要 acl_free 释放，因此不能声明为 c_char_p
+        lib.acl_to_any_text.restype = ctypes.c_void_p
+        lib.acl_free.argtypes = [ctypes.c_void_p]
+        lib.acl_free.restype = ctypes.c_int
+        lib.acl_from_text.argtypes = [ctypes.c_char_p]
+        lib.acl_from_text.restype = ctypes.c_void_p
+        lib.acl_calc_mask.argtypes = [ctypes.POINTER(ctypes.c_void_p)]
+        lib.acl_calc_mask.restype = ctypes.c_int
+        lib.acl_set_file.argtypes = [ctypes.c_char_p, ctypes.c_uint, ctypes.c_void_p]
+        lib.acl_set_file.restype = ctypes.c_int
+        lib.acl_get_entry.argtypes = [ctypes.c_void_p, ctypes.c_int,
+                                      ctypes.POINTER(ctypes.c_void_p)]
+        lib.acl_get_entry.restype = ctypes.c_int
+        lib.acl_get_tag_type.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_int)]
+        lib.acl_get_tag_type.restype = ctypes.c_int
+        lib.acl_get_qualifier.argtypes = [ctypes.c_void_p]
+        lib.acl_get_qualifier.restype = ctypes.c_void_p
+        lib.acl_get_permset.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_void_p)]
+        lib.acl_get_permset.restype = ctypes.c_int
+        lib.acl_get_perm.argtypes = [ctypes.c_void_p, ctypes.c_uint]
+        lib.acl_get_perm.restype = ctypes.c_int
+        return lib
+    return None
+
+
+_lib = _load_libacl()
+AVAILABLE = _lib is not None
+
+
+def _raise_errno(path: str):
+    err = ctypes.get_errno()
+    raise OSError(err, os.strerror(err), path)
+
+
+def get_acl_text(path: str, acl_type: int = ACL_TYPE_ACCESS, options: int = 0) -> bytes:
+    """读取文件 ACL 并返回 getfacl 格式文本的原始字节，options 为 TEXT_* 选项"""
+    acl = _lib.acl_get_file(os.fsencode(path), acl_type)
+    if not acl:
+        _raise_errno(path)
+    try:
+        text = _lib.acl_to_any_text(acl, None, b'\n', options)
+        if not text:
+            _raise_errno(path)
+        try:
+            return ctypes.string_at(text)
+        finally:
+            _lib.acl_free(text)
+    finally:
+        _lib.acl_free(acl)
+
+
+def get_acl_entries(path: str, acl_type: int = ACL_TYPE_ACCESS) -> list:
+    """逐条读取文件 ACL，返回 [(tag, uid/gid 或 None, r=4 w=2 x=1 权限位)]"""
+    acl = _lib.acl_get_file(os.fsencode(path), acl_type)
+    if not acl:
+        _raise_errno(path)
+    try:
+        entries = []
+        entry = ctypes.c_void_p()
+        tag = ctypes.c_int()
+        permset = ctypes.c_void_p()
+        which = ACL_FIRST_ENTRY
+        while True:
+            ret = _lib.acl_get_entry(acl, which, ctypes.byref(entry))
+            if ret == 0:
+                break
+            if ret < 0 or _lib.acl_get_tag_type(entry, ctypes.byref(tag)) != 0 \
+                    or _lib.acl_get_permset(entry, ctypes.byref(permset)) != 0:
+                _raise_errno(path)
+            which = ACL_NEXT_ENTRY
+
+            qualifier = None
+            if tag.value in (ACL_USER, ACL_GROUP):
+                qualifier_p = _lib.acl_get_qualifier(entry)
+                if not qualifier_p:
+                    _raise_errno(path)
+                qualifier = ctypes.c_uint.from_address(qualifier_p).value
+                _lib.acl_free(qualifier_p)
+
+            perm = 0
+            for bit in (ACL_READ, ACL_WRITE, ACL_EXECUTE):
+                if _lib.acl_get_perm(permset, bit) == 1:
+                    perm |= bit
+            entries.append((tag.value, qualifier, perm))
+        return entries
+    finally:
+        _lib.acl_free(acl)
+
+
+def _encode_entries(acl_entries) -> dict:
+    """将 ACL 条目编码为 {标签:限定符 -> 条目} 字典"""
+    return {entry.rpartition(b':')[0]: entry for entry in map(os.fsencode, acl_entries)}
+
+
+def _modify(path: str, new_entries: dict):
+    """将已编码的条目合并到文件的访问 ACL 中并写回"""
+    # 使用数字 ID，libacl 不会调用不可重入的 getpwuid/getpwnam，可多线程并发
+    merged = {}
+    for line in get_acl_text(path, options=TEXT_NUMERIC_IDS).split(b'\n'):
+        if line:
+            merged[line.rpartition(b':')[0]] = line
+    merged.pop(b'mask:', None)
+    merged.update(new_entries)
+
+    acl = ctypes.c_void_p(_lib.acl_from_text(b','.join(merged.values())))
+    if not acl:
+        _raise_errno(path)
+    try:
+        if _lib.acl_calc_mask(ctypes.byref(acl)) != 0:
+            _raise_errno(path)
+        if _lib.acl_set_file(os.fsencode(path), ACL_TYPE_ACCESS, acl) != 0:
+            _raise_errno(path)
+    finally:
+        _lib.acl_free(acl)
+
+
+def modify_acls(paths, acl_entries_list) -> list:
+    """批量合并数字 ID 的 ACL 条目 (如 user:1001:rwx)，等价于 setfacl -m，返回失败的 [(路径, OSError)]"""
+    failures = []
+    encoded = {}
+    for path, acl_entries in zip(paths, acl_entries_list):
+        key = tuple(acl_entries)
+        new_entries = encoded.get(key)
+        if new_entries is None:
+            new_entries = encoded[key] = _encode_entries(acl_entries)
+        try:
+            _modify(path, new_entries)
+        except OSError as e:
+            failures.append((path, e))
+    return failures
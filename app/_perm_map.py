@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+POSIX 权限到 NFSv4 权限的简单映射 (r -> read_data, w -> write_data, x -> execute)
+以及用户名/组名检查，供迁移工具、诊断工具和测试脚本共用
+"""
+
+import string
+
+# 按 r/w/x 三个权限位组合 (r=4, w=2, x=1) 索引的 NFSv4 权限
+_PERM_LUT = ['', 'x', 'w', 'wx', 'r', 'rx', 'rw', 'rwx']
+# 标准三字符 POSIX 权限 (如 'r-x') 到 NFSv4 权限的直接映射
+POSIX_TO_NFS4 = {
+    ('r' if i & 4 else '-') + ('w' if i & 2 else '-') + ('x' if i & 1 else '-'): perms
+    for i, perms in enumerate(_PERM_LUT)
+}
+
+# 用户名或组名中允许的字符，允许@符号用于域名格式的用户名
+_VALID_NAME_CHARS = frozenset(string.ascii_letters + string.digits + '_-@.')
+
+
+def map_perm(posix_perms: str) -> str:
+    """将 POSIX 权限字符串转换为 NFSv4 权限，无权限时返回空字符串"""
+    perms = POSIX_TO_NFS4.get(posix_perms)
+    if perms is None:
+        # 非标准格式 (如 'rw') 时按包含的权限字母组合查表
+        perms = _PERM_LUT[(('r' in posix_perms) << 2) |
+                          (('w' in posix_perms) << 1) |
+                          ('x' in posix_perms)]
+    return perms
+
+
+def is_valid_name(name: str) -> bool:
+    """检查用户名或组名是否有效"""
+    if not name or name.isdigit():
+        return False
+    # 常见的纯 ASCII 标识符形式的名称无需逐字符检查
+    if name.isascii() and name.isidentifier():
+        return True
+    return all(c in _VALID_NAME_CHARS for c in name)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+基于扩展属性 (xattr) 的 ACL 读写
+直接读取 system.posix_acl_access 并写入 system.nfs4_acl，
+省去 ACL 文本的生成、解析以及 nfs4_setfacl 进程
+"""
+
+import os
+import errno
+import struct
+
+POSIX_ACL_XATTR = 'system.posix_acl_access'
+NFS4_ACL_XATTR = 'system.nfs4_acl'
+
+# linux/posix_acl_xattr.h
+POSIX_ACL_XATTR_VERSION = 2
+ACL_USER_OBJ = 0x01
+ACL_USER = 0x02
+ACL_GROUP_OBJ = 0x04
+ACL_GROUP = 0x08
+ACL_MASK = 0x10
+ACL_OTHER = 0x20
+ACL_UNDEFINED_ID = 0xFFFFFFFF
+
+_POSIX_HEADER = struct.Struct('<I')
+_POSIX_ENTRY = struct.Struct('<HHI')
+
+# NFSv4 ACE 类型、标志和权限位 (RFC 7530)，字母与 nfs4_setfacl 一致
+_NFS4_TYPES = {'A': 0, 'D': 1, 'U': 2, 'L': 3}
+_NFS4_FLAGS = {
+    'f': 0x1, 'd': 0x2, 'n': 0x4, 'i': 0x8,
+    'S': 0x10, 'F': 0x20, 'g': 0x40,
+}
+_NFS4_PERMS = {
+    'r': 0x1, 'w': 0x2, 'a': 0x4, 'n': 0x8, 'N': 0x10, 'x': 0x20,
+    'D': 0x40, 't': 0x80, 'T': 0x100, 'd': 0x10000, 'c': 0x20000,
+    'C': 0x40000, 'o': 0x80000, 'y': 0x100000,
+}
+
+# 文件系统不支持对应 xattr 时的错误码
+_UNSUPPORTED_ERRNOS = {errno.ENOTSUP, errno.EOPNOTSUPP}
+
+
+def is_unsupported(e: OSError) -> bool:
+    """判断异常是否表示文件系统不支持该 xattr"""
+    return e.errno in _UNSUPPORTED_ERRNOS
+
+
+def read_posix_acl(path: str):
+    """读取 POSIX 访问 ACL，返回 [(tag, perm, id)]，没有扩展 ACL 时返回 None"""
+    try:
+        blob = os.getxattr(path, POSIX_ACL_XATTR)
+    except OSError as e:
+        if e.errno == errno.ENODATA:
+            return None
+        raise
+    return decode_posix_acl(blob)
+
+
+def decode_posix_acl(blob: bytes):
+    """解析 system.posix_acl_access 的内容，返回 [(tag, perm, id)]"""
+    (version,) = _POSIX_HEADER.unpack_from(blob)
+    if version != POSIX_ACL_XATTR_VERSION:
+        raise ValueError(f"不支持的 POSIX ACL xattr 版本: {version}")
+    return list(_POSIX_ENTRY.iter_unpack(blob[_POSIX_HEADER.size:]))
+
+
+def perm_to_text(perm: int) -> str:
+    """POSIX 权限位转 rwx 文本"""
+    return (('r' if perm & 4 else '-') +
+            ('w' if perm & 2 else '-') +
+            ('x' if perm & 1 else '-'))
+
+
+def encode_nfs4_acl(acl_specs) -> bytes:
+    """将 nfs4_setfacl 格式的 ACL 条目 (type:flags:principal:perms) 编码为 XDR"""
+    parts = [struct.pack('>I', len(acl_specs))]
+    for spec in acl_specs:
+        ace_type, flags, who, perms = spec.split(':')
+        who = who.encode('utf-8')
+        flag_bits = 0
+        for c in flags:
+            flag_bits |= _NFS4_FLAGS[c]
+        mask = 0
+        for c in perms:
+            mask |= _NFS4_PERMS[c]
+        parts.append(struct.pack('>IIII', _NFS4_TYPES[ace_type], flag_bits, mask, len(who)))
+        parts.append(who + b'\0' * (-len(who) % 4))
+    return b''.join(parts)
+
+
+def write_nfs4_acl(path: str, acl_specs):
+    """以一次 setxattr 替换文件的整个 NFSv4 ACL"""
+    os.setxattr(path, NFS4_ACL_XATTR, encode_nfs4_acl(acl_specs))
@@ -9,33 +9,179 @@ import sys
 import subprocess
 import logging
 import argparse
-import json
 import re
 import pwd
 import grp
+import functools
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Tuple, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import sqlite3
+import stat
+import threading
+import hashlib
+import shutil
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+import _xattr_acl
+from _perm_map import map_perm, is_valid_name
+
+# NFSv4 ACL格式: [A|D]:[flags]:[principal]:[permissions]
+_NFS4_ACL_RE = re.compile(r'^[AD]:[fg]?:[^:]*:[rwaDxtTnNcy]*$')
+
+
+def _empty_acl(owner_name: str, group_name: str) -> Dict:
+    """创建空的 ACL 信息结构"""
+    return {
+        'owner': {'name': owner_name, 'perms': None},
+        'group_owner': {'name': group_name, 'perms': None},
+        'user': [],
+        'group': [],
+        'mask': None,
+        'other': None
+    }
+
+
+def _acl_from_xattr(entries, stat_info: os.stat_result) -> Dict:
+    """将 system.posix_acl_access 的条目转换为 ACL 信息结构，entries 为 None 时取自 mode"""
+    acl_entries = _empty_acl(_uid_to_name(stat_info.st_uid), _gid_to_name(stat_info.st_gid))
+    perm_to_text = _xattr_acl.perm_to_text
+    
+    if entries is None:
+        mode = stat_info.st_mode
+        acl_entries['owner']['perms'] = perm_to_text(mode >> 6)
+        acl_entries['group_owner']['perms'] = perm_to_text(mode >> 3)
+        acl_entries['other'] = perm_to_text(mode)
+        return acl_entries
+    
+    for tag, perm, qualifier in entries:
+        perms = perm_to_text(perm)
+        if tag == _xattr_acl.ACL_USER_OBJ:
+            acl_entries['owner']['perms'] = perms
+        elif tag == _xattr_acl.ACL_USER:
+            acl_entries['user'].append({'name': _uid_to_name(qualifier), 'perms': perms})
+        elif tag == _xattr_acl.ACL_GROUP_OBJ:
+            acl_entries['group_owner']['perms'] = perms
+        elif tag == _xattr_acl.ACL_GROUP:
+            acl_entries['group'].append({'name': _gid_to_name(qualifier), 'perms': perms})
+        elif tag == _xattr_acl.ACL_MASK:
+            acl_entries['mask'] = perms
+        elif tag == _xattr_acl.ACL_OTHER:
+            acl_entries['other'] = perms
+    return acl_entries
+
+
+def _has_extended_acl(posix_acl: Dict) -> bool:
+    """是否存在扩展 ACL 条目；只有属主/属组/其他三项时权限完全由 mode 表示"""
+    return bool(posix_acl['user'] or posix_acl['group'] or posix_acl['mask'] is not None)
+
+
+def _hash_acl(posix_acl: Dict) -> str:
+    """计算 ACL 内容的 128 位摘要，用于记录到数据库中比较 ACL 是否变化"""
+    canonical = repr((
+        posix_acl['owner']['name'], posix_acl['owner']['perms'],
+        posix_acl['group_owner']['name'], posix_acl['group_owner']['perms'],
+        sorted((e['name'], e['perms']) for e in posix_acl['user']),
+        sorted((e['name'], e['perms']) for e in posix_acl['group']),
+        posix_acl['mask'], posix_acl['other'],
+    )).encode('utf-8', 'surrogateescape')
+    if xxhash is not None:
+        return xxhash.xxh3_128_hexdigest(canonical)
+    return hashlib.blake2b(canonical, digest_size=16).hexdigest()
+
+
+@functools.lru_cache(maxsize=4096)
+def _uid_to_name(uid: int) -> str:
+    """UID 转用户名（带缓存，避免每个文件都查询 NSS），找不到时返回数字ID"""
+    try:
+        return pwd.getpwuid(uid).pw_name
+    except KeyError:
+        return str(uid)
+
+
+@functools.lru_cache(maxsize=4096)
+def _gid_to_name(gid: int) -> str:
+    """GID 转组名（带缓存，避免每个文件都查询 NSS），找不到时返回数字ID"""
+    try:
+        return grp.getgrgid(gid).gr_name
+    except KeyError:
+        return str(gid)
+
+
+# subprocess 只有在可执行文件为绝对路径且 close_fds=False 时才用 posix_spawn 代替 fork，
+# Python 创建的文件描述符默认不可继承，close_fds=False 不会泄露数据库等句柄
+@functools.lru_cache(maxsize=None)
+def _cmd(name: str) -> str:
+    """返回外部命令的绝对路径"""
+    return shutil.which(name) or name
+
+# 子进程中使用的迁移工具实例，由父进程在创建进程池前设置并通过 fork 继承
+_worker_tool = None
+
+
+# 扫描结果条目: (源路径, 相对源目录的路径, 源文件 stat 结果)
+ScanItem = Tuple[str, str, Optional[os.stat_result]]
+
+
+def _migrate_worker(item: ScanItem) -> Tuple[str, bool, str, Optional[tuple]]:
+    """进程池任务入口：迁移单个文件，迁移记录返回给父进程写入数据库"""
+    source_path, rel_path, source_stat = item
+    return _worker_tool._migrate_file(source_path, source_stat, rel_path)
+
+
+def _iter_fwalk(root: str):
+    """遍历目录树，产出 (所在目录fd, 名称, 相对路径)，目录fd只在继续迭代前有效"""
+    root_len = len(os.path.join(root, ''))
+    # 与 os.walk 一致：不跟随符号链接，忽略无法读取的目录
+    for dir_path, dirs, filenames, dir_fd in os.fwalk(root):
+        rel_dir = os.path.join(dir_path[root_len:], '') if len(dir_path) >= root_len else ''
+        for name in dirs + filenames:
+            yield dir_fd, name, rel_dir + name
+
 
 class ACLMigrationTool:
     """POSIX ACL 到 NFSv4 ACL 迁移工具"""
     
+    # 默认的NFSv4权限条目（必须保留）
+    DEFAULT_NFS4_ACLS = [
+        'A::OWNER@:rwatTnNcCy',
+        'A:g:GROUP@:rxtncy',
+        'A::EVERYONE@:rtncy'
+    ]
+    
+    # 迁移记录每累计多少条写入一次数据库
+    RECORD_FLUSH_ROWS = 1000
+    
+    # 每次分发给子进程的文件数，摊薄进程间通信开销
+    WORKER_CHUNKSIZE = 64
+    
     def __init__(self, source_dir: str, dest_dir: str, log_dir: str = "logs",
-                 db_path: str = None, workers: int = 4, incremental: bool = False, 
+                 db_path: str = None, workers: int = None, incremental: bool = False, 
                  migrate_ownership: bool = False, background: bool = False, debug: bool = False,
                  domain: str = None, folder_only: bool = False):
         self.source_dir = Path(source_dir).resolve()
         self.dest_dir = Path(dest_dir).resolve()
+        # 热路径中用字符串前缀计算相对路径和目标路径
+        self._src_prefix = os.path.join(str(self.source_dir), '')
+        self._dest_root = str(self.dest_dir)
         self.log_dir = Path(log_dir)
-        self.workers = workers
+        # 默认并发数为 CPU 核心数 × 2，ACL 操作大部分时间在等待文件系统
+        self.workers = workers or (os.cpu_count() or 2) * 2
         self.incremental = incremental
         self.migrate_ownership = migrate_ownership
         self.background = background
         self.debug = debug
         self.domain = domain
+        # 带域名后缀的用户/组名缓存，同一名称在整棵树中只生成一次
+        self._name_intern = {}
         self.folder_only = folder_only
+        self.single_file = self.source_dir.is_file()
         
         # 创建日志目录
         self.log_dir.mkdir(parents=True, exist_ok=True)
@@ -61,6 +207,10 @@ class ACLMigrationTool:
         if db_path is None:
             db_path = self.log_dir / "acl_migration.db"
         self.db_path = db_path
+        # 每个线程一个数据库连接；迁移记录先缓存，按批写入
+        self._tls = threading.local()
+        self._pending_records = []
+        self._pending_lock = threading.Lock()
         self._init_database()
         
         # 统计信息
@@ -74,20 +224,36 @@ class ACLMigrationTool:
         
     def _init_database(self):
         """初始化数据库用于增量迁移"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._conn().cursor()
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS migrated_files (
                 source_path TEXT PRIMARY KEY,
                 dest_path TEXT,
                 mtime REAL,
-                acl_hash TEXT,
+                acl_hash TEXT,  -- ACL 内容的 128 位摘要 (xxh3 或 blake2b)
                 migrated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 status TEXT
             )
         ''')
-        conn.commit()
-        conn.close()
+        # WAL 模式允许读写并发，synchronous=NORMAL 避免每次提交都 fsync
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        
+        # 增量模式下一次性加载已成功迁移的记录，避免每个文件查询一次数据库
+        self._migrated_mtimes = {}
+        if self.incremental:
+            cursor.execute("SELECT source_path, mtime FROM migrated_files WHERE status = 'success'")
+            self._migrated_mtimes = dict(cursor.fetchall())
+    
+    def _conn(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接（首次使用时创建）"""
+        conn = getattr(self._tls, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._tls.conn = conn
+        return conn
     
     def reset_database(self):
         """重置数据库，清除所有迁移记录"""
@@ -133,135 +299,66 @@ class ACLMigrationTool:
         """检查文件是否已经迁移过"""
         if not self.incremental:
             return False
-            
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            'SELECT mtime, status FROM migrated_files WHERE source_path = ?',
-            (source_path,)
-        )
-        result = cursor.fetchone()
-        conn.close()
         
-        if result and result[1] == 'success':
-            stored_mtime = result[0]
-            if abs(stored_mtime - mtime) < 0.001:
-                return True
-        return False
+        stored_mtime = self._migrated_mtimes.get(source_path)
+        return stored_mtime is not None and abs(stored_mtime - mtime) < 0.001
         
     def _record_migration(self, source_path: str, dest_path: str, 
                          mtime: float, acl_hash: str, status: str):
-        """记录迁移状态"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO migrated_files 
-            (source_path, dest_path, mtime, acl_hash, status)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (source_path, dest_path, mtime, acl_hash, status))
-        conn.commit()
-        conn.close()
+        """记录迁移状态（缓存后按批写入数据库）"""
+        with self._pending_lock:
+            self._pending_records.append((source_path, dest_path, mtime, acl_hash, status))
+            if len(self._pending_records) >= self.RECORD_FLUSH_ROWS:
+                self._flush_records_locked()
+    
+    def _flush_records(self):
+        """将缓存的迁移记录写入数据库"""
+        with self._pending_lock:
+            self._flush_records_locked()
+    
+    def _flush_records_locked(self):
+        """批量写入迁移记录，调用方需持有 _pending_lock"""
+        if not self._pending_records:
+            return
+        conn = self._conn()
+        conn.execute('BEGIN')
+        try:
+            conn.executemany('''
+                INSERT OR REPLACE INTO migrated_files 
+                (source_path, dest_path, mtime, acl_hash, status)
+                VALUES (?, ?, ?, ?, ?)
+            ''', self._pending_records)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._pending_records = []
         
-    def get_posix_acl(self, file_path: str) -> Optional[Dict]:
+    def get_posix_acl(self, file_path: str, stat_info: os.stat_result = None) -> Optional[Dict]:
         """获取文件的 POSIX ACL 和所有权信息"""
         try:
-            # 获取ACL信息
-            result = subprocess.run(
-                ['getfacl', '--absolute-names', '--omit-header', file_path],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            
-            # 获取文件所有权信息
-            stat_info = os.stat(file_path)
+            if stat_info is None:
+                stat_info = os.stat(file_path)
             try:
-                owner_name = pwd.getpwuid(stat_info.st_uid).pw_name
-            except KeyError:
-                owner_name = str(stat_info.st_uid)
-            try:
-                group_name = grp.getgrgid(stat_info.st_gid).gr_name
-            except KeyError:
-                group_name = str(stat_info.st_gid)
-            
-            acl_entries = {
-                'owner': {'name': owner_name, 'perms': None},
-                'group_owner': {'name': group_name, 'perms': None},
-                'user': [],
-                'group': [],
-                'mask': None,
-                'other': None
-            }
-            
-            for line in result.stdout.strip().split('\n'):
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                    
-                match = re.match(r'(user|group|mask|other):([^:]*):([rwx-]+)', line)
-                if match:
-                    acl_type, name, perms = match.groups()
-                    
-                    if acl_type == 'user':
-                        if name == '':
-                            # 文件所有者权限
-                            acl_entries['owner']['perms'] = perms
-                        else:
-                            # 扩展用户ACL
-                            acl_entries['user'].append({'name': name, 'perms': perms})
-                    elif acl_type == 'group':
-                        if name == '':
-                            # 文件组所有者权限
-                            acl_entries['group_owner']['perms'] = perms
-                        else:
-                            # 扩展组ACL
-                            acl_entries['group'].append({'name': name, 'perms': perms})
-                    elif acl_type == 'mask':
-                        acl_entries['mask'] = perms
-                    elif acl_type == 'other':
-                        acl_entries['other'] = perms
-                        
-            return acl_entries
-            
-        except subprocess.CalledProcessError as e:
-            self.logger.error(f"获取 POSIX ACL 失败 {file_path}: {e.stderr}")
+                entries = _xattr_acl.read_posix_acl(file_path)
+            except OSError as e:
+                if not _xattr_acl.is_unsupported(e):
+                    raise
+                # 文件系统不支持 POSIX ACL xattr 时权限完全由 mode 表示
+                entries = None
+            return _acl_from_xattr(entries, stat_info)
+            
+        except OSError as e:
+            self.logger.error(f"获取 POSIX ACL 失败 {file_path}: {e.strerror}")
             return None
         except Exception as e:
             self.logger.error(f"解析 POSIX ACL 失败 {file_path}: {str(e)}")
             return None
-            
-    def convert_posix_to_nfs4(self, posix_acl: Dict, file_path: str) -> List[str]:
+    
+    def convert_posix_to_nfs4(self, posix_acl: Dict, is_dir: bool = False) -> List[str]:
         """将 POSIX ACL 转换为 NFSv4 ACL 命令"""
         nfs4_acls = []
-        is_dir = os.path.isdir(file_path)
-        
-        def posix_to_nfs4_perms(posix_perms: str, is_directory: bool = False) -> str:
-            """
-            简化权限映射，与测试脚本保持一致
-            """
-            if posix_perms == '---':
-                return ""
-            
-            # 使用最简单的权限映射
-            perms = ""
-            
-            if 'r' in posix_perms:
-                perms += 'r'  # read_data
-            if 'w' in posix_perms:
-                perms += 'w'  # write_data
-            if 'x' in posix_perms:
-                perms += 'x'  # execute
-            
-            return perms
-        
-        def is_valid_name(name: str) -> bool:
-            """检查用户名或组名是否有效"""
-            if not name or name.isdigit():
-                return False
-            # 检查是否包含特殊字符，允许@符号用于域名格式的用户名
-            import string
-            valid_chars = string.ascii_letters + string.digits + '_-@.'
-            return all(c in valid_chars for c in name)
+        file_type = "目录" if is_dir else "文件"
         
         # 只处理扩展ACL，不处理文件所有者和组所有者
         # 添加扩展用户ACL
@@ -274,12 +371,12 @@ class ACLMigrationTool:
                 continue
                 
             # 添加域名后缀（如果提供）
-            full_name = f"{name}@{self.domain}" if self.domain else name
+            full_name = self._full_name(name)
                 
-            nfs4_perms = posix_to_nfs4_perms(perms, is_dir)
+            nfs4_perms = map_perm(perms)
             if nfs4_perms:  # 只添加非空权限
                 acl_entry = f"A::{full_name}:{nfs4_perms}"
-                self.logger.debug(f"生成用户ACL: {name}:{perms} -> {acl_entry}")
+                self.logger.debug(f"生成用户ACL({file_type}): {name}:{perms} -> {acl_entry}")
                 nfs4_acls.append(acl_entry)
             
         # 添加扩展组ACL
@@ -292,16 +389,24 @@ class ACLMigrationTool:
                 continue
                 
             # 添加域名后缀（如果提供）
-            full_name = f"{name}@{self.domain}" if self.domain else name
+            full_name = self._full_name(name)
                 
-            nfs4_perms = posix_to_nfs4_perms(perms, is_dir)
+            nfs4_perms = map_perm(perms)
             if nfs4_perms:  # 只添加非空权限
                 acl_entry = f"A:g:{full_name}:{nfs4_perms}"
-                self.logger.debug(f"生成组ACL: {name}:{perms} -> {acl_entry}")
+                self.logger.debug(f"生成组ACL({file_type}): {name}:{perms} -> {acl_entry}")
                 nfs4_acls.append(acl_entry)
             
         return nfs4_acls
         
+    def _full_name(self, name: str) -> str:
+        """返回 NFSv4 主体名（按需添加域名后缀），重复的名称复用同一字符串"""
+        full_name = self._name_intern.get(name)
+        if full_name is None:
+            full_name = sys.intern(f"{name}@{self.domain}" if self.domain else name)
+            self._name_intern[name] = full_name
+        return full_name
+    
     def apply_nfs4_acl(self, file_path: str, nfs4_acls: List[str]) -> bool:
         """应用 NFSv4 ACL 到目标文件"""
         try:
@@ -322,81 +427,89 @@ class ACLMigrationTool:
             return False
     
     def _set_acl_replace(self, file_path: str, nfs4_acls: List[str]) -> bool:
-        """使用-s选项替换整个ACL"""
+        """使用-s选项一次性替换整个ACL"""
         try:
-            # 添加默认的NFSv4权限条目（必须保留）
-            default_acls = [
-                'A::OWNER@:rwatTnNcCy',
-                'A:g:GROUP@:rxtncy',
-                'A::EVERYONE@:rtncy'
-            ]
-            
             # 先迁移的ACL，再加默认ACL
-            all_acls = nfs4_acls + default_acls
+            all_acls = nfs4_acls + self.DEFAULT_NFS4_ACLS
             acl_spec = ','.join(all_acls)
             self.logger.debug(f"替换ACL: {file_path} -> {acl_spec}")
             
-            result = subprocess.run(
-                ['nfs4_setfacl', '-s', acl_spec, file_path],
-                capture_output=True,
-                text=True
-            )
-            
-            if result.returncode != 0:
-                self.logger.error(f"设置ACL失败 {file_path}: {result.stderr.strip()}")
+            # 一次 setxattr 直接写入整个 NFSv4 ACL，无需启动 nfs4_setfacl
+            try:
+                _xattr_acl.write_nfs4_acl(file_path, all_acls)
+                return True
+            except OSError as e:
+                if not _xattr_acl.is_unsupported(e):
+                    self.logger.warning(f"批量设置ACL失败，改为逐条应用 {file_path}: {e.strerror}")
+                    return self._apply_acl_individually(file_path, nfs4_acls)
+                # nfs4_setfacl 同样通过 setxattr 写入，目标不支持时无法设置
+                self.logger.error(f"目标文件系统不支持 NFSv4 ACL {file_path}: {e.strerror}")
                 return False
             
-            return True
-            
         except Exception as e:
             self.logger.error(f"设置ACL异帰: {str(e)}")
             return False
     
+    def _apply_acl_individually(self, file_path: str, nfs4_acls: List[str]) -> bool:
+        """批量设置失败时的回退路径：逐条添加ACL以定位出错的条目"""
+        # 先只设置默认ACL，再逐条追加迁移的ACL
+        result = subprocess.run(
+            [_cmd('nfs4_setfacl'), '-s', ','.join(self.DEFAULT_NFS4_ACLS), file_path],
+            capture_output=True,
+            text=True,
+            close_fds=False
+        )
+        if result.returncode != 0:
+            self.logger.error(f"设置ACL失败 {file_path}: {result.stderr.strip()}")
+            return False
+        
+        success = True
+        for acl in nfs4_acls:
+            result = subprocess.run(
+                [_cmd('nfs4_setfacl'), '-a', acl, file_path],
+                capture_output=True,
+                text=True,
+                close_fds=False
+            )
+            if result.returncode != 0:
+                self.logger.error(f"设置ACL条目失败 {file_path}: {acl} - {result.stderr.strip()}")
+                success = False
+        
+        return success
+    
     def _validate_nfs4_acl(self, acl: str) -> bool:
         """验证NFSv4 ACL条目格式"""
-        import re
-        # NFSv4 ACL格式: [A|D]:[flags]:[principal]:[permissions]
         # 根据你的示例: A:g:dev0_test1@mpdemo1.example.com:rwaDxtTnNcy
-        pattern = r'^[AD]:[fg]?:[^:]*:[rwaDxtTnNcy]*$'
-        return bool(re.match(pattern, acl))
+        return bool(_NFS4_ACL_RE.match(acl))
     
 
             
-    def migrate_file_ownership(self, source_file: Path, dest_file: Path) -> bool:
+    def migrate_file_ownership(self, source_file: str, dest_file: str,
+                               source_stat: os.stat_result = None,
+                               dest_stat: os.stat_result = None) -> bool:
         """迁移文件所有权"""
         try:
-            source_stat = source_file.stat()
-            dest_stat = dest_file.stat()
+            if source_stat is None:
+                source_stat = os.stat(source_file)
+            if dest_stat is None:
+                dest_stat = os.stat(dest_file)
             
             # 检查是否需要更改所有权
             if source_stat.st_uid == dest_stat.st_uid and source_stat.st_gid == dest_stat.st_gid:
                 self.logger.debug(f"所有权已匹配，无需更改: {dest_file}")
                 return True
             
-            # 获取源文件的用户名和组名
-            try:
-                owner_name = pwd.getpwuid(source_stat.st_uid).pw_name
-            except KeyError:
-                self.logger.warning(f"无法找到UID {source_stat.st_uid} 对应的用户名，使用数字ID")
-                owner_name = str(source_stat.st_uid)
-            
-            try:
-                group_name = grp.getgrgid(source_stat.st_gid).gr_name
-            except KeyError:
-                self.logger.warning(f"无法找到GID {source_stat.st_gid} 对应的组名，使用数字ID")
-                group_name = str(source_stat.st_gid)
+            # 获取源文件的用户名和组名（仅用于日志）
+            owner_name = _uid_to_name(source_stat.st_uid)
+            group_name = _gid_to_name(source_stat.st_gid)
             
             self.logger.debug(f"迁移所有权: {dest_file} -> {owner_name}:{group_name}")
             
-            # 使用 chown 命令设置所有权（使用用户名:组名格式）
-            result = subprocess.run(
-                ['chown', f'{owner_name}:{group_name}', str(dest_file)],
-                capture_output=True,
-                text=True
-            )
-            
-            if result.returncode != 0:
-                self.logger.error(f"设置文件所有权失败 {dest_file}: {result.stderr}")
+            # 直接调用 chown 系统调用，避免每个文件 fork+exec chown 命令
+            try:
+                os.chown(dest_file, source_stat.st_uid, source_stat.st_gid)
+            except OSError as e:
+                self.logger.error(f"设置文件所有权失败 {dest_file}: {e.strerror}")
                 self.logger.error(f"尝试的所有权: {owner_name}:{group_name}")
                 return False
             
@@ -407,53 +520,70 @@ class ACLMigrationTool:
             self.logger.error(f"迁移文件所有权异常 {dest_file}: {str(e)}")
             return False
     
-    def migrate_file_acl(self, source_file: Path) -> Tuple[str, bool, str]:
-        """迁移单个文件的所有权和 ACL"""
+    def migrate_file_acl(self, source_file: Path, source_stat: os.stat_result = None,
+                         rel_path: str = None) -> Tuple[str, bool, str]:
+        """迁移单个文件的所有权和 ACL，并记录迁移状态"""
+        file_path, success, message, record = self._migrate_file(str(source_file), source_stat, rel_path)
+        if record is not None:
+            self._record_migration(*record)
+        return (file_path, success, message)
+    
+    def _migrate_file(self, source_path: str, source_stat: os.stat_result = None,
+                      rel_path: str = None) -> Tuple[str, bool, str, Optional[tuple]]:
+        """迁移单个文件的所有权和 ACL，返回值最后一项为待写入数据库的迁移记录"""
         try:
+            if source_stat is None:
+                source_stat = os.stat(source_path)
+            
             # 如果启用folder_only模式，跳过非目录文件
-            if self.folder_only and not source_file.is_dir():
-                return (str(source_file), True, "跳过(非目录)")
+            if self.folder_only and not stat.S_ISDIR(source_stat.st_mode):
+                return (source_path, True, "跳过(非目录)", None)
             # 处理单文件和目录模式
-            if self.source_dir.is_file():
-                # 单文件模式：直接使用目标路径
-                dest_file = self.dest_dir
-            else:
-                # 目录模式：计算相对路径
-                rel_path = source_file.relative_to(self.source_dir)
-                dest_file = self.dest_dir / rel_path
+            if rel_path is None:
+                # 单文件模式相对路径为空；目录模式按源目录前缀截取
+                rel_path = '' if self.single_file else source_path[len(self._src_prefix):]
+            dest_file = os.path.join(self._dest_root, rel_path) if rel_path else self._dest_root
             
-            if not dest_file.exists():
-                return (str(source_file), False, "目标文件不存在")
+            # 一次 stat 同时完成存在性检查和所有权读取
+            try:
+                dest_stat = os.stat(dest_file)
+            except OSError:
+                return (source_path, False, "目标文件不存在", None)
                 
-            source_mtime = source_file.stat().st_mtime
-            if self._is_already_migrated(str(source_file), source_mtime):
-                return (str(source_file), True, "已迁移(跳过)")
+            source_mtime = source_stat.st_mtime
+            if self._is_already_migrated(source_path, source_mtime):
+                return (source_path, True, "已迁移(跳过)", None)
             
             # 1. 迁移文件所有权
             ownership_success = True
+            # 所有权确有变更的文件即使没有扩展 ACL 也计为成功迁移
+            ownership_changed = self.migrate_ownership and (
+                source_stat.st_uid != dest_stat.st_uid or source_stat.st_gid != dest_stat.st_gid)
             if self.migrate_ownership:
-                ownership_success = self.migrate_file_ownership(source_file, dest_file)
+                ownership_success = self.migrate_file_ownership(source_path, dest_file,
+                                                                source_stat, dest_stat)
             
             # 2. 迁移 ACL
-            posix_acl = self.get_posix_acl(str(source_file))
+            posix_acl = self.get_posix_acl(source_path, source_stat)
             acl_success = True
             acl_count = 0
+            # 没有扩展 ACL 的文件权限已由 mode 表示，无需设置 NFSv4 ACL
+            no_extended_acl = posix_acl is not None and not _has_extended_acl(posix_acl)
             
-            if posix_acl is not None:
-                nfs4_acls = self.convert_posix_to_nfs4(posix_acl, str(source_file))
+            if posix_acl is not None and not no_extended_acl:
+                nfs4_acls = self.convert_posix_to_nfs4(posix_acl, stat.S_ISDIR(source_stat.st_mode))
                 if nfs4_acls:
-                    acl_success = self.apply_nfs4_acl(str(dest_file), nfs4_acls)
+                    acl_success = self.apply_nfs4_acl(dest_file, nfs4_acls)
                     acl_count = len(nfs4_acls)
             
-            # 记录迁移状态
-            acl_hash = json.dumps(posix_acl, sort_keys=True) if posix_acl else ""
             overall_success = ownership_success and acl_success
             status = "success" if overall_success else "failed"
             
-            self._record_migration(
-                str(source_file), str(dest_file),
-                source_mtime, acl_hash, status
-            )
+            # 迁移记录只在增量模式下使用，非增量模式不计算哈希也不写数据库
+            record = None
+            if self.incremental:
+                acl_hash = _hash_acl(posix_acl) if posix_acl else ""
+                record = (source_path, dest_file, source_mtime, acl_hash, status)
             
             # 生成结果消息
             messages = []
@@ -463,43 +593,43 @@ class ACLMigrationTool:
                 messages.append(f"{acl_count}个ACL条目")
             
             if overall_success:
+                if no_extended_acl and not ownership_changed:
+                    messages.insert(0, "无扩展ACL")
+                    return (source_path, True, ', '.join(messages), record)
                 if messages:
-                    return (str(source_file), True, f"成功迁移: {', '.join(messages)}")
+                    return (source_path, True, f"成功迁移: {', '.join(messages)}", record)
                 else:
-                    return (str(source_file), True, "无需迁移")
+                    return (source_path, True, "无需迁移", record)
             else:
                 failed_items = []
                 if self.migrate_ownership and not ownership_success:
                     failed_items.append("所有权")
                 if not acl_success:
                     failed_items.append("ACL")
-                return (str(source_file), False, f"迁移失败: {', '.join(failed_items)}")
+                return (source_path, False, f"迁移失败: {', '.join(failed_items)}", record)
                 
         except Exception as e:
-            self.logger.error(f"迁移文件异常 {source_file}: {str(e)}")
-            return (str(source_file), False, str(e))
+            self.logger.error(f"迁移文件异常 {source_path}: {str(e)}")
+            return (source_path, False, str(e), None)
             
-    def scan_files(self) -> List[Path]:
-        """扫描源路径（支持单文件和目录）"""
+    def scan_files(self) -> List[ScanItem]:
+        """扫描源路径（支持单文件和目录），返回 (源路径, 相对路径, stat结果) 列表"""
         files = []
         
-        if self.source_dir.is_file():
+        if self.single_file:
             # 单文件模式
             self.logger.info(f"单文件模式: {self.source_dir}")
-            files.append(self.source_dir)
+            files.append((str(self.source_dir), '', None))
         elif self.source_dir.is_dir():
             # 目录模式
             self.logger.info(f"扫描源目录: {self.source_dir}")
-            for root, dirs, filenames in os.walk(self.source_dir):
-                root_path = Path(root)
-                
-                for dirname in dirs:
-                    dir_path = root_path / dirname
-                    files.append(dir_path)
-                    
-                for filename in filenames:
-                    file_path = root_path / filename
-                    files.append(file_path)
+            for dir_fd, name, rel_path in _iter_fwalk(str(self.source_dir)):
+                try:
+                    entry_stat = os.stat(name, dir_fd=dir_fd)
+                except OSError:
+                    # 留给迁移阶段重新 stat 并报告错误
+                    entry_stat = None
+                files.append((self._src_prefix + rel_path, rel_path, entry_stat))
         else:
             raise ValueError(f"源路径不存在或不是文件/目录: {self.source_dir}")
                 
@@ -519,31 +649,58 @@ class ACLMigrationTool:
         files = self.scan_files()
         self.stats['total_files'] = len(files)
         
-        with ThreadPoolExecutor(max_workers=self.workers) as executor:
-            futures = {
-                executor.submit(self.migrate_file_acl, f): f 
-                for f in files
-            }
-            
-            for future in as_completed(futures):
-                file_path, success, message = future.result()
-                
-                if "已迁移(跳过)" in message:
-                    self.stats['skipped'] += 1
-                    self.logger.debug(f"跳过: {file_path}")
-                elif "跳过(非目录)" in message:
-                    self.logger.debug(f"跳过非目录: {file_path}")
-                elif "无扩展ACL" in message:
-                    self.stats['no_acl'] += 1
-                    self.logger.debug(f"无ACL: {file_path}")
-                elif success:
-                    self.stats['success'] += 1
-                    self.logger.info(f"成功: {file_path} - {message}")
-                else:
-                    self.stats['failed'] += 1
-                    self.logger.error(f"失败: {file_path} - {message}")
-                    
+        try:
+            self._run_workers(files)
+        finally:
+            # 写入剩余的迁移记录，并将 WAL 合并回主数据库文件
+            self._flush_records()
+            self._conn().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        
         self.print_summary()
+    
+    def _run_workers(self, files: List[ScanItem]):
+        """多进程并发迁移文件，在父进程中记录迁移状态并汇总统计"""
+        global _worker_tool
+        # 单文件模式直接在本进程迁移，无需创建进程池
+        if self.single_file:
+            for source_path, rel_path, source_stat in files:
+                self._handle_result(*self._migrate_file(source_path, source_stat, rel_path))
+            return
+        if not files:
+            return
+        # 子进程通过 fork 继承当前实例，任务只需传递扫描结果
+        _worker_tool = self
+        try:
+            # 进程池会一次性 fork 全部进程，文件数少时只创建所需数量
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(files)),
+                                     mp_context=multiprocessing.get_context('fork')) as executor:
+                results = executor.map(_migrate_worker, files,
+                                       chunksize=self.WORKER_CHUNKSIZE)
+                for result in results:
+                    self._handle_result(*result)
+        finally:
+            _worker_tool = None
+    
+    def _handle_result(self, file_path: str, success: bool, message: str,
+                       record: Optional[tuple]):
+        """处理单个文件的迁移结果"""
+        if record is not None:
+            self._record_migration(*record)
+        
+        if "已迁移(跳过)" in message:
+            self.stats['skipped'] += 1
+            self.logger.debug(f"跳过: {file_path}")
+        elif "跳过(非目录)" in message:
+            self.logger.debug(f"跳过非目录: {file_path}")
+        elif "无扩展ACL" in message:
+            self.stats['no_acl'] += 1
+            self.logger.debug(f"无ACL: {file_path}")
+        elif success:
+            self.stats['success'] += 1
+            self.logger.info(f"成功: {file_path} - {message}")
+        else:
+            self.stats['failed'] += 1
+            self.logger.error(f"失败: {file_path} - {message}")
         
     def print_summary(self):
         """打印迁移摘要"""
@@ -580,7 +737,7 @@ def main():
     parser.add_argument('-s', '--source', help='源路径 (文件或目录, POSIX ACL)')
     parser.add_argument('-d', '--dest', help='目标路径 (文件或目录, NFSv4 ACL)')
     parser.add_argument('-l', '--log-dir', default='logs', help='日志目录')
-    parser.add_argument('-w', '--workers', type=int, default=4, help='并发线程数')
+    parser.add_argument('-w', '--workers', type=int, help='并发进程数 (默认: CPU核心数 × 2)')
     parser.add_argument('--incremental', action='store_true', help='增量模式')
     parser.add_argument('--ownership', action='store_true', help='迁移文件所有权')
     parser.add_argument('-b', '--background', action='store_true', help='后台运行模式')
@@ -11,6 +11,12 @@ import pwd
 import grp
 from pathlib import Path
 
+from _perm_map import map_perm, is_valid_name
+
+# getfacl 文本中的用户/组 ACL 条目
+_ACL_LINE_RE = re.compile(r'(user|group):([^:]*):([rwx-]+)')
+
+
 def get_posix_acl(file_path: str):
     """获取POSIX ACL"""
     try:
@@ -32,7 +38,7 @@ def get_posix_acl(file_path: str):
             if not line or line.startswith('#'):
                 continue
                 
-            match = re.match(r'(user|group):([^:]*):([rwx-]+)', line)
+            match = _ACL_LINE_RE.match(line)
             if match:
                 acl_type, name, perms = match.groups()
                 if acl_type == 'user' and name:
@@ -51,29 +57,6 @@ def convert_to_nfs4(acl_entries, file_path: str):
     nfs4_acls = []
     is_dir = os.path.isdir(file_path)
     
-    def posix_to_nfs4_perms(posix_perms: str, is_directory: bool = False) -> str:
-        if posix_perms == '---':
-            return ""
-        
-        # 使用最简单的权限映射
-        perms = ""
-        
-        if 'r' in posix_perms:
-            perms += 'r'  # read_data
-        if 'w' in posix_perms:
-            perms += 'w'  # write_data
-        if 'x' in posix_perms:
-            perms += 'x'  # execute
-        
-        return perms
-    
-    def is_valid_name(name: str) -> bool:
-        if not name or name.isdigit():
-            return False
-        import string
-        valid_chars = string.ascii_letters + string.digits + '_-'
-        return all(c in valid_chars for c in name)
-    
     print(f"\n转换为NFSv4 ACL (文件类型: {'目录' if is_dir else '文件'}):")
     
     # 处理用户ACL
@@ -94,7 +77,7 @@ def convert_to_nfs4(acl_entries, file_path: str):
         except KeyError:
             print(f"    ⚠️  用户不存在: {name}")
         
-        nfs4_perms = posix_to_nfs4_perms(perms, is_dir)
+        nfs4_perms = map_perm(perms)
         if nfs4_perms:
             acl_entry = f"A::{name}:{nfs4_perms}"
             nfs4_acls.append(acl_entry)
@@ -120,7 +103,7 @@ def convert_to_nfs4(acl_entries, file_path: str):
         except KeyError:
             print(f"    ⚠️  组不存在: {name}")
         
-        nfs4_perms = posix_to_nfs4_perms(perms, is_dir)
+        nfs4_perms = map_perm(perms)
         if nfs4_perms:
             acl_entry = f"A:g:{name}:{nfs4_perms}"
             nfs4_acls.append(acl_entry)
@@ -9,14 +9,139 @@ import sys
 import subprocess
 import random
 import argparse
-from pathlib import Path
+import asyncio
+import queue
+import threading
+import functools
+import itertools
+import shutil
+import collections
+import pwd
+import grp
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+
+try:
+    from tqdm import tqdm
+except ImportError:
+    tqdm = None
+
+import _libacl
+
+logger = logging.getLogger('setup_random_acl')
+
+# 单次 setfacl 调用的参数总字节数上限，留出一半 ARG_MAX 给环境变量
+try:
+    _SETFACL_ARG_BYTES = os.sysconf('SC_ARG_MAX') // 2
+except (ValueError, OSError):
+    _SETFACL_ARG_BYTES = 65536
+
+
+# 每个线程独立的随机数生成器，避免共享模块级 random 的内部锁
+_tls = threading.local()
+
+
+def _rng() -> random.Random:
+    """返回当前线程的随机数生成器"""
+    rng = getattr(_tls, 'rng', None)
+    if rng is None:
+        rng = _tls.rng = random.Random()
+    return rng
+
+
+def _scandir_recurse(top: str, workers: int = 1):
+    """多线程并发遍历目录树，依次返回所有文件和子目录的路径字符串"""
+    dirs = queue.Queue()
+    results = queue.Queue()
+    
+    def scan():
+        while True:
+            path = dirs.get()
+            if path is None:
+                return
+            paths = []
+            subdirs = []
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        paths.append(entry.path)
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+            except OSError:
+                pass
+            results.put((paths, subdirs))
+    
+    threads = [threading.Thread(target=scan, daemon=True) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    
+    # 只有当前线程向队列添加目录，待处理目录数归零即遍历完成
+    dirs.put(top)
+    pending = 1
+    try:
+        while pending:
+            paths, subdirs = results.get()
+            for path in subdirs:
+                dirs.put(path)
+            pending += len(subdirs) - 1
+            yield from paths
+    finally:
+        for _ in threads:
+            dirs.put(None)
+
+
+@functools.lru_cache(maxsize=None)
+def _local_names(path: str) -> frozenset:
+    """读取 /etc/passwd 或 /etc/group 中的全部名称"""
+    try:
+        with open(path, encoding='utf-8', errors='surrogateescape') as f:
+            return frozenset(line.split(':', 1)[0] for line in f
+                             if line.strip() and not line.startswith('#'))
+    except OSError:
+        return frozenset()
+
+
+@functools.lru_cache(maxsize=None)
+def _user_exists(name: str) -> bool:
+    """检查用户是否存在，先查本地 /etc/passwd，未找到时再查询 NSS (LDAP/SSSD 等)"""
+    if name in _local_names('/etc/passwd'):
+        return True
+    try:
+        pwd.getpwnam(name)
+        return True
+    except KeyError:
+        return False
+
+
+@functools.lru_cache(maxsize=None)
+def _group_exists(name: str) -> bool:
+    """检查组是否存在，先查本地 /etc/group，未找到时再查询 NSS (LDAP/SSSD 等)"""
+    if name in _local_names('/etc/group'):
+        return True
+    try:
+        grp.getgrnam(name)
+        return True
+    except KeyError:
+        return False
+
 
 class RandomACLSetup:
     """随机POSIX ACL设置工具"""
     
-    def __init__(self, target_dir: str, percentage: int = 50):
-        self.target_dir = Path(target_dir).resolve()
+    # 每次 setfacl 调用携带的最大路径数，路径较长时还受 ARG_MAX 限制
+    SETFACL_BATCH_SIZE = 500
+    # 每个线程一次通过 libacl 处理的文件数，减少逐个文件提交任务的开销
+    LIBACL_BATCH_SIZE = 256
+    # 目录扫描和 setfacl 的并发线程数上限，避免压垮元数据服务器
+    MAX_WORKERS = 32
+    
+    def __init__(self, target_dir: str, percentage: int = 50, workers: int = None):
+        # 全程使用字符串路径，避免为每个文件创建 Path 对象
+        self.target_dir = os.path.realpath(target_dir)
         self.percentage = percentage
+        # setfacl 的开销主要在进程创建和内核调用上，线程并发即可，无需多进程
+        self.workers = workers or min(self.MAX_WORKERS, (os.cpu_count() or 1) * 4)
         
         # 预定义用户和组
         all_users = ['tzhu', 'mary', 'bob', 'peter', 'john', 'laura', 'demouser1', 'demouser2', 'demouser3']
@@ -33,7 +158,6 @@ class RandomACLSetup:
         
         if not self.groups:
             print("警告: 没有找到预定义的组，将使用当前用户的主组")
-            import grp, os
             try:
                 gid = os.getgid()
                 group_name = grp.getgrgid(gid).gr_name
@@ -44,126 +168,233 @@ class RandomACLSetup:
         # 权限组合
         self.permissions = ['r--', 'rw-', 'r-x', 'rwx', '-wx', '--x']
         
+        # 预先生成每个用户/组的全部ACL条目，生成时只需随机挑选，无需逐个拼接字符串
+        self._user_acl_pool = [[f"user:{user}:{perm}" for perm in self.permissions]
+                               for user in self.users]
+        self._group_acl_pool = [[f"group:{group}:{perm}" for perm in self.permissions]
+                                for group in self.groups]
+        # libacl 使用的数字 ID 条目 (如 user:1001:rwx)，uid/gid 在此一次性解析，
+        # 处理线程中不再进行 NSS 查询
+        self._numeric_acl = {}
+        for kind, names, lookup in (('user', self.users, lambda n: pwd.getpwnam(n).pw_uid),
+                                    ('group', self.groups, lambda n: grp.getgrnam(n).gr_gid)):
+            for name in names:
+                try:
+                    qualifier = lookup(name)
+                except KeyError:
+                    qualifier = name
+                for perm in self.permissions:
+                    self._numeric_acl[f"{kind}:{name}:{perm}"] = f"{kind}:{qualifier}:{perm}"
+        
         self.stats = {
             'total_files': 0,
             'processed': 0,
             'skipped': 0,
             'failed': 0
         }
+        self._setfacl = shutil.which('setfacl') or 'setfacl'
+        # 设置失败的原因，处理完成后统一输出，避免逐个文件打印拖慢处理
+        self.errors = []
     
     def generate_random_acl(self) -> list:
         """生成随机ACL条目"""
-        acl_entries = []
+        # 随机选择1-3个用户、1-2个组，每个用户/组随机选择一种权限
+        rng = _rng()
+        num_users = rng.randint(1, 3)
+        num_groups = rng.randint(1, 2)
         
-        # 随机选择1-3个用户
-        num_users = random.randint(1, 3)
-        selected_users = random.sample(self.users, num_users)
-        
-        for user in selected_users:
-            perm = random.choice(self.permissions)
-            acl_entries.append(f"user:{user}:{perm}")
-        
-        # 随机选择1-2个组
-        num_groups = random.randint(1, 2)
-        selected_groups = random.sample(self.groups, num_groups)
-        
-        for group in selected_groups:
-            perm = random.choice(self.permissions)
-            acl_entries.append(f"group:{group}:{perm}")
-        
-        return acl_entries
+        selected = rng.sample(self._user_acl_pool, num_users) + rng.sample(self._group_acl_pool, num_groups)
+        perm_indexes = rng.choices(range(len(self.permissions)), k=len(selected))
+        return [entries[i] for entries, i in zip(selected, perm_indexes)]
     
     def _get_existing_users(self, user_list: list) -> list:
         """检查系统中存在的用户"""
-        import pwd
-        existing_users = []
-        for user in user_list:
-            try:
-                pwd.getpwnam(user)
-                existing_users.append(user)
-            except KeyError:
-                pass
-        return existing_users
+        return [user for user in user_list if _user_exists(user)]
     
     def _get_existing_groups(self, group_list: list) -> list:
         """检查系统中存在的组"""
-        import grp
-        existing_groups = []
-        for group in group_list:
-            try:
-                grp.getgrnam(group)
-                existing_groups.append(group)
-            except KeyError:
-                pass
-        return existing_groups
+        return [group for group in group_list if _group_exists(group)]
     
-    def apply_acl(self, file_path: Path, acl_entries: list) -> bool:
-        """应用ACL到文件"""
+    def apply_acl_batch(self, file_entries) -> Tuple[int, int]:
+        """批量应用 (路径, ACL条目)，返回 (处理的文件数, 成功的文件数)"""
+        # 各批次只返回成功数，由主线程汇总，统计信息无需加锁
+        # 进度条按 tqdm 默认频率刷新，未安装 tqdm 时不显示
+        progress = tqdm(unit='文件') if tqdm else None
         try:
-            # 构建setfacl命令
-            cmd = ['setfacl', '-m', ','.join(acl_entries), str(file_path)]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                error_msg = result.stderr.strip()
-                if "Operation not permitted" in error_msg:
-                    print(f"权限不足 {file_path}: 需要sudo权限或文件所有者权限")
-                elif "Invalid argument" in error_msg:
-                    print(f"无效参数 {file_path}: 用户或组可能不存在")
-                else:
-                    print(f"设置ACL失败 {file_path}: {error_msg}")
-                return False
-            
-            return True
-            
-        except Exception as e:
-            print(f"应用ACL异常 {file_path}: {str(e)}")
-            return False
+            if _libacl.AVAILABLE:
+                return self._apply_acl_libacl_stream(iter(file_entries), progress)
+            return self._apply_acl_setfacl(file_entries, progress)
+        finally:
+            if progress:
+                progress.close()
     
-    def scan_and_process(self):
-        """扫描并处理文件"""
-        print(f"扫描目录: {self.target_dir}")
-        files = []
+    def _apply_acl_libacl_stream(self, file_entries, progress) -> Tuple[int, int]:
+        """从迭代器中逐批取出文件交给线程池，返回 (处理的文件数, 成功的文件数)"""
+        total = 0
+        succeeded = 0
+        # 限制未完成的批次数，避免遍历速度超过设置速度时积压整棵目录树
+        pending = collections.deque()
         
-        for root, dirs, filenames in os.walk(self.target_dir):
-            root_path = Path(root)
-            
-            # 处理目录
-            for dirname in dirs:
-                dir_path = root_path / dirname
-                files.append(dir_path)
-            
-            # 处理文件
-            for filename in filenames:
-                file_path = root_path / filename
-                files.append(file_path)
+        def collect():
+            nonlocal succeeded
+            count, future = pending.popleft()
+            succeeded += future.result()
+            if progress:
+                progress.update(count)
         
-        self.stats['total_files'] = len(files)
-        print(f"找到 {len(files)} 个文件/目录")
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                batch = list(itertools.islice(file_entries, self.LIBACL_BATCH_SIZE))
+                if not batch:
+                    break
+                total += len(batch)
+                paths, entries = zip(*batch)
+                pending.append((len(batch), executor.submit(self._apply_acl_libacl, paths, entries)))
+                if len(pending) > self.workers * 2:
+                    collect()
+            while pending:
+                collect()
+        return total, succeeded
+    
+    def _apply_acl_setfacl(self, file_entries, progress) -> Tuple[int, int]:
+        """通过 setfacl 批量应用ACL，返回 (处理的文件数, 成功的文件数)"""
+        total = 0
+        files_by_spec = {}
+        for file_path, acl_entries in file_entries:
+            total += 1
+            # ACL 条目排序后作为键，条目相同（顺序不同）的文件合并到同一次 setfacl
+            files_by_spec.setdefault(','.join(sorted(acl_entries)), []).append(file_path)
         
-        # 随机处理指定百分比的文件
-        num_to_process = int(len(files) * self.percentage / 100)
-        files_to_process = random.sample(files, num_to_process)
+        specs = []
+        batches = []
+        for spec, paths in files_by_spec.items():
+            for batch in self._split_batches(spec, paths):
+                specs.append(spec)
+                batches.append(batch)
+        
+        return total, asyncio.run(self._setfacl_batches(specs, batches, progress))
+    
+    def _split_batches(self, spec: str, paths: list):
+        """将同一ACL的文件按路径数和命令行长度上限切分为多批"""
+        # 每个参数额外占用一个指针和结尾的 NUL
+        limit = _SETFACL_ARG_BYTES - len(spec) - 64
+        batch = []
+        size = 0
+        for path in paths:
+            arg_size = len(os.fsencode(path)) + 9
+            if batch and (len(batch) >= self.SETFACL_BATCH_SIZE or size + arg_size > limit):
+                yield batch
+                batch = []
+                size = 0
+            batch.append(path)
+            size += arg_size
+        if batch:
+            yield batch
+    
+    def _apply_acl_libacl(self, paths, acl_entries_list) -> int:
+        """通过 libacl 为一批文件设置ACL，返回成功的文件数"""
+        numeric_acl = self._numeric_acl
+        failures = _libacl.modify_acls(
+            paths, [[numeric_acl[e] for e in entries] for entries in acl_entries_list])
+        for file_path, e in failures:
+            self._report_failure(file_path, e.strerror)
+        return len(paths) - len(failures)
+    
+    async def _setfacl_batches(self, specs: list, batches: list, progress=None) -> int:
+        """在单个线程中同时运行多个 setfacl 进程，返回成功的文件数"""
+        semaphore = asyncio.Semaphore(self.workers)
+        
+        async def run(spec, paths):
+            async with semaphore:
+                succeeded = await self._setfacl_batch(spec, paths)
+            if progress:
+                progress.update(len(paths))
+            return succeeded
+        
+        return sum(await asyncio.gather(*(run(spec, paths) for spec, paths in zip(specs, batches))))
+    
+    async def _setfacl_batch(self, spec: str, paths: list) -> int:
+        """一次 setfacl 调用为多个文件设置相同的ACL，返回成功的文件数"""
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                self._setfacl, '-m', spec, *paths,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+                close_fds=False
+            )
+            _, stderr = await proc.communicate()
+        except Exception as e:
+            self.errors.append(f"应用ACL异常: {str(e)}")
+            return 0
         
-        print(f"将为 {len(files_to_process)} 个文件设置随机ACL ({self.percentage}%)")
+        if proc.returncode == 0:
+            return len(paths)
+        
+        # setfacl 遇到错误会继续处理其余文件，并为每个失败的文件输出 "setfacl: 路径: 错误"
+        stderr = stderr.decode('utf-8', 'surrogateescape')
+        pending = set(paths)
+        failed = 0
+        for line in stderr.splitlines():
+            file_path, _, error_msg = line.partition(': ')[2].rpartition(': ')
+            if file_path in pending:
+                pending.discard(file_path)
+                failed += 1
+                self._report_failure(file_path, error_msg)
+        
+        if failed == 0:
+            # 错误与具体文件无关（例如ACL条目无效），整批视为失败
+            for file_path in paths:
+                self._report_failure(file_path, stderr.strip())
+            return 0
+        return len(paths) - failed
+    
+    def _report_failure(self, file_path: str, error_msg: str):
+        """输出设置ACL失败的原因"""
+        if "Operation not permitted" in error_msg:
+            self.errors.append(f"权限不足 {file_path}: 需要sudo权限或文件所有者权限")
+        elif "Invalid argument" in error_msg:
+            self.errors.append(f"无效参数 {file_path}: 用户或组可能不存在")
+        else:
+            self.errors.append(f"设置ACL失败 {file_path}: {error_msg}")
+    
+    def _iter_paths(self):
+        """遍历目录树，依次返回所有文件和子目录的路径"""
+        yield from _scandir_recurse(self.target_dir, self.workers)
+    
+    def _iter_selected(self):
+        """按百分比随机抽样并生成ACL，依次返回 (路径, ACL条目)"""
+        rng = _rng()
+        probability = self.percentage / 100
+        verbose = logger.isEnabledFor(logging.DEBUG)
+        
+        for file_path in self._iter_paths():
+            self.stats['total_files'] += 1
+            if rng.random() >= probability:
+                # 未被抽中的文件计为跳过
+                self.stats['skipped'] += 1
+                continue
+            
+            acl_entries = self.generate_random_acl()
+            if verbose:
+                logger.debug(f"设置ACL: {file_path}")
+                logger.debug(f"  ACL: {', '.join(acl_entries)}")
+            yield file_path, acl_entries
+    
+    def scan_and_process(self):
+        """扫描并处理文件"""
+        print(f"扫描目录: {self.target_dir}")
+        print(f"将为 {self.percentage}% 的文件设置随机ACL")
         print(f"可用用户: {', '.join(self.users)}")
         print(f"可用组: {', '.join(self.groups)}")
         print()
         
-        for file_path in files_to_process:
-            if random.random() * 100 < self.percentage:
-                acl_entries = self.generate_random_acl()
-                
-                print(f"设置ACL: {file_path}")
-                print(f"  ACL: {', '.join(acl_entries)}")
-                
-                if self.apply_acl(file_path, acl_entries):
-                    self.stats['processed'] += 1
-                else:
-                    self.stats['failed'] += 1
-            else:
-                self.stats['skipped'] += 1
+        selected, succeeded = self.apply_acl_batch(self._iter_selected())
+        self.stats['processed'] += succeeded
+        self.stats['failed'] += selected - succeeded
+        print(f"找到 {self.stats['total_files']} 个文件/目录，已为其中 {selected} 个设置随机ACL")
+        
+        for message in self.errors:
+            print(message)
     
     def print_summary(self):
         """打印统计摘要"""
@@ -196,9 +427,16 @@ def main():
     parser.add_argument('-d', '--directory', required=True, help='目标目录路径')
     parser.add_argument('-p', '--percentage', type=int, default=50, 
                        help='处理文件的百分比 (默认: 50)')
+    parser.add_argument('-w', '--workers', type=int,
+                       help='并发线程数 (默认: CPU核心数 × 4，最多32)')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                       help='显示每个文件设置的ACL')
     
     args = parser.parse_args()
     
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(message)s', stream=sys.stdout)
+    
     if not os.path.isdir(args.directory):
         print(f"错误: 目录不存在: {args.directory}")
         sys.exit(1)
@@ -207,14 +445,15 @@ def main():
         print(f"错误: 百分比必须在1-100之间: {args.percentage}")
         sys.exit(1)
     
-    # 检查setfacl命令
-    try:
-        subprocess.run(['setfacl', '--version'], capture_output=True, check=True)
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        print("错误: setfacl 命令不可用，请安装 acl 包")
-        sys.exit(1)
+    # 没有 libacl 时需要 setfacl 命令
+    if not _libacl.AVAILABLE:
+        try:
+            subprocess.run(['setfacl', '--version'], capture_output=True, check=True)
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            print("错误: setfacl 命令不可用，请安装 acl 包")
+            sys.exit(1)
     
-    tool = RandomACLSetup(args.directory, args.percentage)
+    tool = RandomACLSetup(args.directory, args.percentage, args.workers)
     
     try:
         tool.scan_and_process()
@@ -3,21 +3,11 @@
 测试NFSv4权限映射
 """
 
+from _perm_map import map_perm
+
 def posix_to_nfs4_perms(posix_perms: str, is_directory: bool = False) -> str:
-    if posix_perms == '---':
-        return ""
-    
     # 使用最简单的权限映射
-    perms = ""
-    
-    if 'r' in posix_perms:
-        perms += 'r'  # read_data
-    if 'w' in posix_perms:
-        perms += 'w'  # write_data
-    if 'x' in posix_perms:
-        perms += 'x'  # execute
-    
-    return perms
+    return map_perm(posix_perms)
 
 def test_permissions():
     test_cases = [
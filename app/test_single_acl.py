@@ -6,6 +6,53 @@
 import subprocess
 import sys
 import os
+import pwd
+import grp
+
+import _libacl
+from _perm_map import map_perm
+
+_TAG_KINDS = {
+    _libacl.ACL_USER_OBJ: 'user',
+    _libacl.ACL_USER: 'user',
+    _libacl.ACL_GROUP_OBJ: 'group',
+    _libacl.ACL_GROUP: 'group',
+    _libacl.ACL_MASK: 'mask',
+    _libacl.ACL_OTHER: 'other',
+}
+
+def read_acl_libacl(source_file):
+    """通过 libacl 逐条读取 ACL，返回 [(类型, 名称, 权限)]，无需运行 getfacl 和解析文本"""
+    entries = []
+    for tag, qualifier, perm in _libacl.get_acl_entries(source_file):
+        name = ''
+        try:
+            if tag == _libacl.ACL_USER:
+                name = pwd.getpwuid(qualifier).pw_name
+            elif tag == _libacl.ACL_GROUP:
+                name = grp.getgrgid(qualifier).gr_name
+        except KeyError:
+            name = str(qualifier)
+        perms = ('r' if perm & _libacl.ACL_READ else '-') + \
+                ('w' if perm & _libacl.ACL_WRITE else '-') + \
+                ('x' if perm & _libacl.ACL_EXECUTE else '-')
+        entries.append((_TAG_KINDS[tag], name, perms))
+    return entries
+
+def read_acl_getfacl(source_file):
+    """运行 getfacl 并解析输出，返回 [(类型, 名称, 权限)]"""
+    result = subprocess.run(['getfacl', '--omit-header', source_file],
+                            capture_output=True, text=True, check=True)
+    entries = []
+    for line in result.stdout.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        kind, _, rest = line.partition(':')
+        name, _, perms = rest.partition(':')
+        # 忽略 getfacl 追加的 "#effective:" 注释
+        entries.append((kind, name, perms[:3]))
+    return entries
 
 def test_acl_migration(source_file, dest_file, domain=None):
     print(f"测试ACL迁移:")
@@ -16,75 +63,53 @@ def test_acl_migration(source_file, dest_file, domain=None):
     
     # 获取源文件POSIX ACL
     print("1. 获取源文件POSIX ACL:")
-    result = subprocess.run(['getfacl', source_file], capture_output=True, text=True)
-    if result.returncode == 0:
-        print(result.stdout)
-    else:
-        print(f"错误: {result.stderr}")
+    try:
+        if _libacl.AVAILABLE:
+            acl = read_acl_libacl(source_file)
+        else:
+            acl = read_acl_getfacl(source_file)
+    except subprocess.CalledProcessError as e:
+        print(f"错误: {e.stderr}")
         return
+    except OSError as e:
+        print(f"错误: {e.strerror}")
+        return
+    for kind, name, perms in acl:
+        print(f"{kind}:{name}:{perms}")
+    print()
     
-    # 解析ACL并生成NFSv4 ACL
+    # 生成NFSv4 ACL
     print("2. 生成NFSv4 ACL条目:")
     nfs4_acls = []
     
-    for line in result.stdout.split('\n'):
-        line = line.strip()
-        if line.startswith('user:') and ':' in line:
-            parts = line.split(':')
-            if len(parts) >= 3 and parts[1]:  # 扩展用户ACL
-                user = parts[1]
-                perms = parts[2]
-                
-                # 简单权限映射
-                nfs4_perms = ""
-                if 'r' in perms:
-                    nfs4_perms += 'r'
-                if 'w' in perms:
-                    nfs4_perms += 'w'
-                if 'x' in perms:
-                    nfs4_perms += 'x'
-                
-                if nfs4_perms:
-                    full_user = f"{user}@{domain}" if domain else user
-                    acl_entry = f"A::{full_user}:{nfs4_perms}"
-                    nfs4_acls.append(acl_entry)
-                    print(f"  {line} -> {acl_entry}")
+    for kind, name, perms in acl:
+        if kind not in ('user', 'group') or not name:  # 只迁移扩展用户/组ACL
+            continue
         
-        elif line.startswith('group:') and ':' in line:
-            parts = line.split(':')
-            if len(parts) >= 3 and parts[1]:  # 扩展组ACL
-                group = parts[1]
-                perms = parts[2]
-                
-                # 简单权限映射
-                nfs4_perms = ""
-                if 'r' in perms:
-                    nfs4_perms += 'r'
-                if 'w' in perms:
-                    nfs4_perms += 'w'
-                if 'x' in perms:
-                    nfs4_perms += 'x'
-                
-                if nfs4_perms:
-                    full_group = f"{group}@{domain}" if domain else group
-                    acl_entry = f"A:g:{full_group}:{nfs4_perms}"
-                    nfs4_acls.append(acl_entry)
-                    print(f"  {line} -> {acl_entry}")
+        # 简单权限映射
+        nfs4_perms = map_perm(perms)
+        if nfs4_perms:
+            full_name = f"{name}@{domain}" if domain else name
+            flags = 'g' if kind == 'group' else ''
+            acl_entry = f"A:{flags}:{full_name}:{nfs4_perms}"
+            nfs4_acls.append(acl_entry)
+            print(f"  {kind}:{name}:{perms} -> {acl_entry}")
     
     if not nfs4_acls:
         print("  没有扩展ACL需要迁移")
         return
     
-    # 应用NFSv4 ACL
+    # 应用NFSv4 ACL，所有条目通过标准输入一次性交给 nfs4_setfacl -A 追加
     print(f"\n3. 应用NFSv4 ACL到目标文件:")
     for acl in nfs4_acls:
         print(f"  应用: {acl}")
-        result = subprocess.run(['nfs4_setfacl', '-a', acl, dest_file], 
-                              capture_output=True, text=True)
-        if result.returncode == 0:
-            print(f"    ✓ 成功")
-        else:
-            print(f"    ✗ 失败: {result.stderr.strip()}")
+    result = subprocess.run(['nfs4_setfacl', '-A', '-', dest_file],
+                          input='\n'.join(nfs4_acls) + '\n',
+                          capture_output=True, text=True)
+    if result.returncode == 0:
+        print(f"    ✓ 成功")
+    else:
+        print(f"    ✗ 失败: {result.stderr.strip()}")
     
     # 显示结果
     print(f"\n4. 迁移后的NFSv4 ACL:")
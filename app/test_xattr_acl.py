@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+测试 xattr ACL 的二进制编解码
+"""
+
+import struct
+
+import _xattr_acl
+
+
+def test_encode_nfs4_acl():
+    # 条目数，然后每个 ACE: 类型、标志、权限位、名称长度、按 4 字节补齐的名称
+    expected = bytes.fromhex(
+        '00000002'
+        '00000000' '00000000' '00000023' '00000009' '626f6240782e636f6d000000'
+        '00000000' '00000040' '001200a9' '00000006' '47524f5550400000'
+    )
+    encoded = _xattr_acl.encode_nfs4_acl(['A::bob@x.com:rwx', 'A:g:GROUP@:rxtncy'])
+    print(f"encode_nfs4_acl: {encoded.hex()}")
+    assert encoded == expected
+
+
+def test_decode_posix_acl():
+    entries = [
+        (_xattr_acl.ACL_USER_OBJ, 6, _xattr_acl.ACL_UNDEFINED_ID),
+        (_xattr_acl.ACL_USER, 5, 1001),
+        (_xattr_acl.ACL_GROUP_OBJ, 4, _xattr_acl.ACL_UNDEFINED_ID),
+        (_xattr_acl.ACL_GROUP, 6, 2001),
+        (_xattr_acl.ACL_MASK, 7, _xattr_acl.ACL_UNDEFINED_ID),
+        (_xattr_acl.ACL_OTHER, 4, _xattr_acl.ACL_UNDEFINED_ID),
+    ]
+    blob = struct.pack('<I', 2) + b''.join(struct.pack('<HHI', *e) for e in entries)
+    decoded = _xattr_acl.decode_posix_acl(blob)
+    print(f"decode_posix_acl: {decoded}")
+    assert decoded == entries
+
+    # 不支持的版本号
+    try:
+        _xattr_acl.decode_posix_acl(struct.pack('<I', 1))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("版本 1 应被拒绝")
+
+
+if __name__ == '__main__':
+    test_encode_nfs4_acl()
+    test_decode_posix_acl()
+    print("OK")
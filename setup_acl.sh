@@ -39,6 +39,7 @@ Random POSIX ACL Setup Tool
 选项:
     -d, --directory DIR     目标目录路径 [必需]
     -p, --percentage NUM    处理文件的百分比 (默认: 50)
+    -w, --workers NUM       并发线程数 (默认: CPU核心数 × 4，最多32)
     -h, --help              显示此帮助信息
 
 示例:
@@ -96,6 +97,7 @@ check_dependencies() {
 main() {
     DIRECTORY=""
     PERCENTAGE=50
+    WORKERS=""
     
     while [[ $# -gt 0 ]]; do
         case $1 in
@@ -107,6 +109,10 @@ main() {
                 PERCENTAGE="$2"
                 shift 2
                 ;;
+            -w|--workers)
+                WORKERS="$2"
+                shift 2
+                ;;
             -h|--help)
                 show_help
                 exit 0
@@ -132,7 +138,12 @@ main() {
     print_info "处理百分比: $PERCENTAGE%"
     echo
     
-    if "$PYTHON_CMD" "$PYTHON_TOOL" -d "$DIRECTORY" -p "$PERCENTAGE"; then
+    local cmd_args=(-d "$DIRECTORY" -p "$PERCENTAGE")
+    if [[ -n "$WORKERS" ]]; then
+        cmd_args+=(-w "$WORKERS")
+    fi
+    
+    if "$PYTHON_CMD" "$PYTHON_TOOL" "${cmd_args[@]}"; then
         print_success "随机ACL设置完成"
     else
         print_error "随机ACL设置失败"